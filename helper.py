@@ -1,21 +1,384 @@
-import json
+import re
+import orjson
+from threading import BoundedSemaphore, Lock
+from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
+from cachetools import TTLCache
+from functools import lru_cache
 from decimal import Decimal
-from datetime import timedelta
-from pytz import timezone
-from flask import jsonify
-from firebase_admin import credentials, firestore, initialize_app
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+from flask.json.provider import DefaultJSONProvider, JSONProvider
+from firebase_admin import credentials, firestore, get_app, initialize_app
 
 
-# Initialising Firestore db
-cred = credentials.Certificate("key.json")
-default_app = initialize_app(cred)
-database = firestore.client()
-
 # the first year group for Ashesi University
 FIRST_YEAR_GROUP = 2002
 
-VOTERS_COLLECTION = database.collection("voters")
-ELECTIONS_COLLECTION = database.collection("elections")
+# timezone elections are run in
+ACCRA_TIMEZONE = ZoneInfo("Africa/Accra")
+
+# every voter's email must be an Ashesi email address
+ASHESI_EMAIL_DOMAIN = "@ashesi.edu.gh"
+
+# keys a voter's information must contain
+VOTERS_KEYS = ("student_id", "firstname", "lastname", "email")
+
+# a student ID is eight ASCII digits: a four digit user id followed by the year group
+STUDENT_ID_PATTERN = re.compile(r"(\d{4})(\d{4})", re.ASCII)
+
+# the maximum number of writes Firestore accepts in one batch
+BATCH_LIMIT = 500
+
+# number of seconds a cached query result stays fresh
+CACHE_TTL = 15
+
+# number of Firestore reads that can overlap with request processing at once
+READ_WORKERS = 8
+
+# thread pool for Firestore reads that overlap with request processing
+EXECUTOR = ThreadPoolExecutor(max_workers=READ_WORKERS)
+
+# idle EXECUTOR workers; a read that finds none runs inline instead of queueing
+_READ_SLOTS = BoundedSemaphore(READ_WORKERS)
+
+# thread pool for committing independent write batches in parallel
+WRITE_EXECUTOR = ThreadPoolExecutor(max_workers=40)
+
+# process-local caches of query results, one per collection
+_QUERY_CACHES = defaultdict(lambda: TTLCache(maxsize=128, ttl=CACHE_TTL))
+# number of times each collection's cache has been invalidated
+_QUERY_GENERATIONS = defaultdict(int)
+_QUERY_CACHE_LOCK = Lock()
+
+# serialises the first calls to get_database from concurrent requests
+_DATABASE_LOCK = Lock()
+
+
+class ValidationError(Exception):
+    """raised when a request cannot be served; the API responds with 
+    the error's payload and status code
+    """
+    
+    def __init__(self, payload, status=400):
+        super().__init__(payload)
+        # a plain message is returned as {"message": ...}; dicts and lists 
+        # of messages are returned as they are
+        self.payload = {"message": payload} if isinstance(payload, str) else payload
+        self.status = status
+
+
+class PartialWriteError(Exception):
+    """raised by write_in_batches when some of its batches failed to commit;
+    the other batches were committed, so their writes have been applied
+    """
+    
+    def __init__(self, num_written, failed_refs, errors):
+        super().__init__(f"{len(failed_refs)} writes failed: {errors[0]}")
+        self.num_written = num_written      # number of writes that were committed
+        self.failed_refs = failed_refs      # documents whose writes were not applied
+        self.errors = errors                # the error of each failed batch
+
+
+@lru_cache(maxsize=1)
+def get_database():
+    """initialises the Firestore db on first use and returns the client shared 
+    by the whole process, so that the credentials and channel are set up in 
+    each worker after it has been forked rather than at import time
+
+    Returns:
+        Client: the Firestore client
+    """
+    
+    # lru_cache does not stop two threads from both making the first call, 
+    # and initialising the default app a second time raises a ValueError
+    with _DATABASE_LOCK:
+        try:
+            get_app()
+        except ValueError:
+            initialize_app(credentials.Certificate("key.json"))
+        return firestore.client()
+
+
+def voters_collection():
+    """returns the voters collection"""
+    
+    return get_database().collection("voters")
+
+
+def elections_collection():
+    """returns the elections collection"""
+    
+    return get_database().collection("elections")
+
+
+class OrjsonProvider(JSONProvider):
+    """Flask JSON provider backed by orjson, used by jsonify and request.get_json.
+    types orjson cannot serialise fall back to Flask's default conversions
+    """
+    
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=DefaultJSONProvider.default).decode()
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+    
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            orjson.dumps(obj, default=DefaultJSONProvider.default), mimetype="application/json"
+        )
+
+
+def stream_json_array(documents):
+    """serialises a list of documents as a JSON array one document at a time, 
+    so that the whole response body is never held in memory at once
+
+    Args:
+        documents (iterable): the documents (dict) to serialise
+
+    Returns:
+        generator: the chunks (bytes) of the JSON array
+    """
+    
+    separator = b"["
+    for document in documents:
+        yield separator
+        yield orjson.dumps(document, default=DefaultJSONProvider.default)
+        separator = b","
+    
+    # an empty list never yields the opening bracket
+    yield b"]" if separator == b"," else b"[]"
+
+
+def index_document(collection, key):
+    """returns the document holding the unique index of a key in a collection
+    - the index document maps every value of the key to the id of the 
+    document holding it, e.g. voters_index/email
+
+    Args:
+        collection (CollectionReference): the indexed Firestore collection
+        key (str): the indexed key
+
+    Returns:
+        DocumentReference: the index document
+    """
+    
+    return get_database().collection(collection.id + "_index").document(key)
+
+
+def unique_index_updates(collection, unique_keys, record, previous=None, id_key="student_id"):
+    """builds the index document writes that keep the unique indexes of a 
+    collection in step with a record being written. each write is meant to 
+    be applied with set(..., merge=True) in the same batch as the record
+
+    Args:
+        collection (CollectionReference): the indexed Firestore collection
+        unique_keys (list): list of unique keys
+        record (dict): the record being written, or None if it is being deleted
+        previous (dict): the record's existing data, if any
+        id_key (str): the key identifying the record
+
+    Returns:
+        list: a list of (DocumentReference, dict) pairs
+    """
+    
+    updates = list()
+    for key in unique_keys:
+        data = dict()
+        if previous and (record is None or previous[key] != record[key]):
+            data[str(previous[key])] = firestore.DELETE_FIELD
+        if record is not None:
+            data[str(record[key])] = record[id_key]
+        if data:
+            updates.append((index_document(collection, key), data))
+    
+    return updates
+
+
+def commit_with_indexes(document_ref, record, index_updates):
+    """writes a record together with its unique index entries in a single
+    atomic batch, so that the record and its indexes cannot drift apart
+
+    Args:
+        document_ref (DocumentReference): the record's document
+        record (dict): the record's data, or None to delete the record
+        index_updates (list): (DocumentReference, dict) pairs from unique_index_updates
+    """
+    
+    batch = get_database().batch()
+    if record is None:
+        batch.delete(document_ref)
+    else:
+        batch.set(document_ref, record)
+    for index_ref, index_data in index_updates:
+        batch.set(index_ref, index_data, merge=True)
+    batch.commit()
+
+
+@firestore.transactional
+def create_with_indexes(transaction, document_ref, record, collection, unique_keys, id_key="student_id"):
+    """creates a new record together with its unique index entries. the record's
+    document and the index documents are read and written within the given 
+    transaction, which Firestore retries if any of them changes in between, 
+    so two concurrent creates cannot both claim the same id or unique value
+
+    Args:
+        transaction (Transaction): the transaction to run in
+        document_ref (DocumentReference): the new record's document
+        record (dict): the record's data
+        collection (CollectionReference): the indexed Firestore collection
+        unique_keys (list): list of unique keys, other than the record's id
+        id_key (str): the key identifying the record (its document id)
+
+    Returns:
+        dict: the created record
+
+    Raises:
+        ValidationError: if the record's id or a unique value already exists
+    """
+    
+    index_refs = [index_document(collection, key) for key in unique_keys]
+    snapshots = {
+        snapshot.reference.path: snapshot 
+        for snapshot in transaction.get_all([document_ref] + index_refs)
+    }
+    
+    # the record's id is its document id, so it is unique if the document does not exist
+    if snapshots[document_ref.path].exists:
+        raise ValidationError({id_key: id_key + " already exists!"})
+    
+    for key, index_ref in zip(unique_keys, index_refs):
+        index = snapshots[index_ref.path].to_dict() or dict()
+        if str(record[key]) in index:
+            raise ValidationError({key: key + " already exists!"})
+    
+    transaction.create(document_ref, record)
+    for index_ref, index_data in unique_index_updates(collection, unique_keys, record, id_key=id_key):
+        transaction.set(index_ref, index_data, merge=True)
+    
+    return record
+
+
+def submit_read(function, *args):
+    """starts a Firestore read on EXECUTOR so that it overlaps with the 
+    caller's own work. the pool is shared by every request in the process, 
+    so when all of its workers are busy the read runs in the calling thread 
+    instead; waiting in the pool's queue would only add latency
+
+    Args:
+        function (callable): the read to run
+        *args: the read's arguments
+
+    Returns:
+        Future: the read's result (or error)
+    """
+    
+    if _READ_SLOTS.acquire(blocking=False):
+        future = EXECUTOR.submit(function, *args)
+        future.add_done_callback(lambda _: _READ_SLOTS.release())
+        return future
+    
+    future = Future()
+    try:
+        future.set_result(function(*args))
+    except Exception as error:
+        future.set_exception(error)
+    return future
+
+
+def write_in_batches(writes, operation="set"):
+    """applies writes through WriteBatches of at most BATCH_LIMIT writes each,
+    so that many documents are written in a few requests instead of one each.
+    the batches are committed in parallel; each batch is atomic on its own, so
+    if any batch fails the others are still committed
+
+    Args:
+        writes (iterable): (DocumentReference, dict) pairs
+        operation (str): the WriteBatch method to apply, "set" or "update"
+
+    Returns:
+        int: the number of writes applied
+
+    Raises:
+        PartialWriteError: if any batch failed, with the writes of every
+        batch that did and did not commit
+    """
+    
+    batches = list()                    # (WriteBatch, documents written by it) pairs
+    num_writes = 0
+    for document_ref, data in writes:
+        if num_writes % BATCH_LIMIT == 0:
+            batches.append((get_database().batch(), list()))
+        getattr(batches[-1][0], operation)(document_ref, data)
+        batches[-1][1].append(document_ref)
+        num_writes += 1
+    
+    # wait for every batch, then collect the failures of all of them
+    futures = [WRITE_EXECUTOR.submit(batch.commit) for batch, _ in batches]
+    failed_refs = list()
+    errors = list()
+    for future, (_, document_refs) in zip(futures, batches):
+        error = future.exception()
+        if error is not None:
+            failed_refs.extend(document_refs)
+            errors.append(error)
+    
+    if errors:
+        raise PartialWriteError(num_writes - len(failed_refs), failed_refs, errors)
+    
+    return num_writes
+
+
+def cached_query(collection, filters=(), fields=None):
+    """returns the documents of a collection matching all equality filters,
+    reusing the result of the same query made in the last CACHE_TTL seconds.
+    the returned documents are shared between requests and must not be modified
+
+    Args:
+        collection (CollectionReference): the Firestore collection
+        filters (tuple): (key, value) pairs the documents must match
+        fields (tuple): fields to read from each document (all fields if None)
+
+    Returns:
+        list: list of the matching documents (dict)
+    """
+    
+    filters = tuple(filters)
+    fields = tuple(fields) if fields is not None else None
+    with _QUERY_CACHE_LOCK:
+        result = _QUERY_CACHES[collection.id].get((filters, fields))
+        generation = _QUERY_GENERATIONS[collection.id]
+    
+    if result is None:
+        query = collection
+        for key, value in filters:
+            query = query.where(key, "==", value)
+        # only transfer the requested fields of each document
+        if fields is not None:
+            query = query.select(fields)
+        result = [document.to_dict() for document in query.stream()]
+        
+        # a result read while this process wrote to the collection may 
+        # predate the write, so it is only cached if no invalidation happened
+        with _QUERY_CACHE_LOCK:
+            if _QUERY_GENERATIONS[collection.id] == generation:
+                _QUERY_CACHES[collection.id][(filters, fields)] = result
+    
+    return result
+
+
+def invalidate_cache(collection):
+    """drops every cached query result of a collection; called after 
+    this process writes to the collection
+
+    Args:
+        collection (CollectionReference): the Firestore collection
+    """
+    
+    with _QUERY_CACHE_LOCK:
+        _QUERY_GENERATIONS[collection.id] += 1
+        _QUERY_CACHES[collection.id].clear()
 
 
 def valid_request_body(request):
@@ -28,7 +391,9 @@ def valid_request_body(request):
         JSON: a boolean of whether or not the request is valid
     """
     
-    if not request.data:
+    # read the raw body; request.data would parse (and consume) form 
+    # encoded bodies before get_json can read them
+    if not request.get_data(cache=True):
         return False    
     return True
 
@@ -38,76 +403,117 @@ def valid_keys(voter_info, expected_keys):
 
     Args:
         voter_info (dict): JSON representation of a voter's information
+        expected_keys (iterable): keys the voter's information must contain
 
     Returns:
         dict: a dictionary of boolean and or list of messages from validation
     """
     
-    result = {"is_valid": False}            # result from validation
-    result_message = []                     # message from validation
-    num_correct_keys = 0                    # variable to keep track of the number of matching keys
-    data_keys = voter_info.keys()
-    
-    for key in expected_keys:
-        if key in data_keys:
-            num_correct_keys += 1
-        else:
-            result_message.append(f"{key.capitalize()} is required")
+    # keys expected but missing from the data, in a single set operation
+    missing_keys = set(expected_keys).difference(voter_info)
+    result = {"is_valid": not missing_keys}         # result from validation
     
-    if num_correct_keys == len(expected_keys):
-        result["is_valid"] = True
-    else:
-        result["message"] = result_message
+    if missing_keys:
+        result["message"] = [f"{key.capitalize()} is required" for key in expected_keys if key in missing_keys]
     
     return result
 
 
-def key_is_unique(key_list, dictionary_list, voter_info):
+def read_unique_indexes(collection, unique_keys):
+    """reads the index documents of all unique keys in a single request
+
+    Args:
+        collection (CollectionReference): the indexed Firestore collection
+        unique_keys (list): list of unique keys
+
+    Returns:
+        dict: a dictionary of key -> index (value -> document id)
+    """
+    
+    index_refs = [index_document(collection, key) for key in unique_keys]
+    return {snapshot.id: snapshot.to_dict() or dict() for snapshot in get_database().get_all(index_refs)}
+
+
+def key_is_unique(collection, unique_keys, voter_info, id_key="student_id", indexes=None):
     """ensures that all values corresponding to unique keys in the provided 
-    voter information is unique (does not already exist in voters file)
+    voter information is unique (does not already exist in the collection).
+    the check stops at the first conflict
 
     Args:
-        key_list (list): list of unique keys
-        dictionary_list (list of dict): a list of voter information (dict)
+        collection (CollectionReference): the Firestore collection to check against
+        unique_keys (list): list of unique keys
         voter_info (dict): a dictionary containing voter information
+        id_key (str): the key identifying the record being validated, so that
+        a record does not conflict with itself on update
+        indexes (dict): the unique indexes if they have already been read
 
     Returns:
         result: a dictionary containing the result from unique test
     """
     
     result = dict()
-    for key in key_list:
-        for voter in dictionary_list:        
-            if voter_info[key] == voter[key] and voter["student_id"] != voter_info["student_id"]:
-                result[key] = key + " already exists!"
+    if indexes is None:
+        indexes = read_unique_indexes(collection, unique_keys)
+    
+    for key in unique_keys:
+        owner = indexes.get(key, dict()).get(str(voter_info[key]))
+        if owner is not None and owner != voter_info[id_key]:
+            result[key] = key + " already exists!"
+            return result
     
     return result
 
 
 def valid_student_id(student_id):
     """ensures that a given student_id is valid
-    - a student ID is valid if it's eight characters long and numeric
+    - a student ID is valid if it's eight characters long and made up of ASCII digits
 
     Args:
         student_id (str): a student's ID
 
     Returns:
         dict: a dictionary containing user_id (the first four values of a student id)
-        and year_group (the year group of the student)
+        and year_group (the year group of the student, as an int)
     """
     
-    # ensure that the student id is of length 8
-    if(len(student_id)) != 8:
+    # ensure that the student id is a string of eight ASCII digits
+    if not isinstance(student_id, str):
         return False
     
-    # ensure that the student id is numeric
-    if not student_id.isnumeric():
+    match = STUDENT_ID_PATTERN.fullmatch(student_id)
+    if match is None:
         return False
     
-    user_id = student_id[:4]
-    year_group = student_id[4:]
+    return {"user_id": match.group(1), "year_group": int(match.group(2))} 
+
+
+def valid_email(email):
+    """ensures that an email is an Ashesi email address with a non-empty local part
+
+    Args:
+        email (str): an email address
+
+    Returns:
+        bool: whether or not the email is valid
+    """
     
-    return {"user_id": user_id, "year_group": year_group} 
+    return (
+        isinstance(email, str) and len(email) > len(ASHESI_EMAIL_DOMAIN) 
+        and email[-len(ASHESI_EMAIL_DOMAIN):] == ASHESI_EMAIL_DOMAIN
+    )
+
+
+def valid_name(name):
+    """ensures that a firstname or lastname is made up of letters only
+
+    Args:
+        name (str): a firstname or lastname
+
+    Returns:
+        bool: whether or not the name is valid
+    """
+    
+    return isinstance(name, str) and name.isalpha()
 
 
 def valid_voter_info(request, unique_keys):
@@ -117,116 +523,228 @@ def valid_voter_info(request, unique_keys):
 
     Args:
         request (tuple): request from client
-        unique_keys (list): a list of keys that should be unique
+        unique_keys (list): a list of keys that should be unique (none are checked if empty)
 
     Returns:
-        dict: dictionary containing the status of the validation 
-        and a JSON representation of the voter's info from the request or
-        appropriate message if an exception occurred
+        dict: the voter's info from the request
+
+    Raises:
+        ValidationError: if the voter's info is not valid
     """
     
     # ensure that the voter_info is not empty
     if not valid_request_body(request):
-        return jsonify({"message": "Voter information missing!"}), 400
+        raise ValidationError("Voter information missing!")
     
     # get request data
-    voter_info = json.loads(request.data)
+    voter_info = request.get_json(force=True, silent=True) or dict()
     
     # ensure that the data contains all expected fields
     # if validation fails, return appropriate message
-    # expected keys
-    VOTERS_KEYS = [
-            "student_id", "firstname", "lastname", "email"
-        ]
-    
     validate_data = valid_keys(voter_info, VOTERS_KEYS)
     if validate_data["is_valid"] == False:
-        return jsonify(validate_data["message"]), 400
+        raise ValidationError(validate_data["message"])
+    
+    # start reading the unique indexes so that the round trip overlaps 
+    # with the remaining checks, which only need the request data
+    if unique_keys:
+        indexes_future = submit_read(read_unique_indexes, voters_collection(), unique_keys)
     
     # ensure that the student_id is synctactically correct since
     # the system assumes a certain format for later computation
     student_id_is_valid = valid_student_id(voter_info["student_id"])
     if not student_id_is_valid:
-        return jsonify({"message": "Student ID is not valid."}), 400
-    elif int(student_id_is_valid["year_group"]) < FIRST_YEAR_GROUP:
-        return jsonify({"message": "Student year group is invalid."})
+        raise ValidationError("Student ID is not valid.")
+    elif student_id_is_valid["year_group"] < FIRST_YEAR_GROUP:
+        raise ValidationError("Student year group is invalid.")
+    
+    # store the year group with the voter so that voters can be queried by it
+    voter_info["year_group"] = student_id_is_valid["year_group"]
     
     # ensure that the email is a valid ashesi email
-    if not voter_info["email"].endswith("@ashesi.edu.gh"):
-        return jsonify({"message": "Email must be a valid Ashesi email address."}), 400
+    if not valid_email(voter_info["email"]):
+        raise ValidationError("Email must be a valid Ashesi email address.")
     
     # ensure that firstname and lastname is valid (is a string)
-    if not str(voter_info["firstname"]).isalpha() or not str(voter_info["lastname"]).isalpha():
-        return jsonify({"message": "Firstname or Lastname must be a string."}), 400
-    
-    # reading existing data into a list
-    voters_data = VOTERS_COLLECTION.get()
-    
-    # if no voter has been registered, skip unique test
-    if len(voters_data) == 0:
-        return {"data": voter_info}
+    if not valid_name(voter_info["firstname"]) or not valid_name(voter_info["lastname"]):
+        raise ValidationError("Firstname or Lastname must be a string.")
     
     # ensure keys are unique
     # if unique contraints fails, return appropriate response
-    data_list = list()
-    for document in voters_data:
-        data_list.append(document.to_dict())
+    if unique_keys:
+        ununique_result = key_is_unique(voters_collection(), unique_keys, voter_info, indexes=indexes_future.result())
+        if len(ununique_result) > 0:
+            raise ValidationError(ununique_result)
     
-    ununique_result = key_is_unique(unique_keys, data_list, voter_info)
-    if len(ununique_result) > 0:
-        return jsonify(ununique_result), 400
-    
-    return {"data": voter_info}
+    return voter_info
 
 
 def get_voters(id_list):
+    """ensures that all voters with the given student ids are registered,
+    reading all of their documents (keyed by student id) in a single request
+
+    Args:
+        id_list (list): list of student ids
+
+    Returns:
+        list: the registered voters' information if all voters are registered, 
+        else False
+    """
+    
+    # each distinct id is looked up once
+    voter_refs = [voters_collection().document(student_id) for student_id in set(id_list)]
+    voters_data = get_database().get_all(voter_refs, field_paths=["student_id", "is_registered"])
     
     result_list = list()
-    return_data = dict()
-    # read voters database
-    voters_data = VOTERS_COLLECTION.get()
+    for voter in voters_data:
+        if not voter.exists:
+            return False
+        
+        # decode each snapshot once (snapshot.get copies the field as well)
+        voter_info = voter.to_dict()
+        if not voter_info.get("is_registered"):
+            return False
+        result_list.append(voter_info)
+
+    return result_list
+
+
+def map_key(value, name):
+    """returns the id of a position or candidate as a map key; Firestore
+    map keys must be strings, so numeric ids are stored as strings
+
+    Args:
+        value: the id from the election's information
+        name (str): what the id belongs to, used in the error message
+
+    Returns:
+        str: the id as a string
+
+    Raises:
+        ValidationError: if the id is not a string or a number
+    """
     
-    if not voters_data:
-        return {"message": "No voter has been registered!"}
+    if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+        raise ValidationError(f"{name} id must be a string or a number.")
     
-    for voter in voters_data:
-        voter = voter.to_dict()
-        if voter["student_id"] in id_list and bool(voter["is_registered"]) == True:
-            result_list.append(voter)
-            if len(result_list) == len(id_list):
-                return return_data
+    return str(value)
 
-    return False
 
+def positions_by_id(positions):
+    """turns an election's list of positions, each with a list of candidates,
+    into a map of positions keyed by position_id, each with a map of 
+    candidates keyed by candidate_id
 
-def compute_time(time_period):
-    num_days = int(int(time_period) / 24)
-    num_hours = 0
-    num_minutes = 0
+    Args:
+        positions (list): list of positions (dict)
+
+    Returns:
+        dict: dictionary of position_id -> position
 
-    if time_period % 24 != 0:
-        hours = time_period - (num_days * 24)
-        num_hours = int(hours)
+    Raises:
+        ValidationError: if an id is not a string or a number, or is repeated
+    """
+    
+    result = dict()
+    for position in positions:
+        candidates = dict()
+        for candidate in position["candidates"]:
+            candidate["candidate_id"] = map_key(candidate["candidate_id"], "Candidate")
+            # a repeated id would silently replace the earlier candidate
+            if candidate["candidate_id"] in candidates:
+                raise ValidationError(f"Candidate with id {candidate['candidate_id']} is listed more than once for a position!")
+            candidates[candidate["candidate_id"]] = candidate
+        position["candidates"] = candidates
         
-        if isinstance(hours, Decimal):
-            hour_decimal = Decimal(str(hours)) % 1
-            num_minutes = int(60 * hour_decimal)
+        position["position_id"] = map_key(position["position_id"], "Position")
+        if position["position_id"] in result:
+            raise ValidationError(f"Position {position['position_id']} is listed more than once!")
+        result[position["position_id"]] = position
+    
+    return result
+
+
+@firestore.transactional
+def cast_vote(transaction, election_ref, position_id, vote_info):
+    """records a student's vote for a candidate in an election position.
+    the election is read and the vote checked and written within the given 
+    transaction, which Firestore retries if the election changes in between
+
+    Args:
+        transaction (Transaction): the transaction to run in
+        election_ref (DocumentReference): the election's document
+        position_id (str): the id of the position being voted for
+        vote_info (dict): dictionary containing student_id and candidate_id
+
+    Returns:
+        dict: the updated election's information
+
+    Raises:
+        ValidationError: if the vote could not be cast
+    """
+    
+    election = election_ref.get(transaction=transaction)
+    if not election.exists:
+        raise ValidationError(f"Election with code {election_ref.id} does not exist!", 404)
+    
+    election_info = election.to_dict()
+    
+    # ensure that the position exist
+    position = election_info["positions"].get(position_id)
+    if position is None:
+        raise ValidationError(f"Position {position_id} does not exist in this election!", 404)
+    
+    # ensure that the candidate is valid
+    candidates = position["candidates"]
+    candidate = candidates.get(vote_info["candidate_id"])
+    if candidate is None:
+        raise ValidationError(f"Candidate with id {vote_info['candidate_id']} has not been registered for the {position['position_name']} position!", 404)
+    
+    # ensure that the student hasn't voted before for this position
+    if vote_info["student_id"] in position["position_voters"]:
+        raise ValidationError("You cannot vote twice for one position!", 403)
+    
+    # cast vote by adding student id to the position's voters and to only 
+    # this candidate's candidate_voters
+    position_voters_path = firestore.FieldPath("positions", position_id, "position_voters").to_api_repr()
+    candidate_voters_path = firestore.FieldPath(
+        "positions", position_id, "candidates", vote_info["candidate_id"], "candidate_voters"
+    ).to_api_repr()
+    transaction.update(election_ref, {
+        position_voters_path: firestore.ArrayUnion([vote_info["student_id"]]),
+        candidate_voters_path: firestore.ArrayUnion([vote_info["student_id"]])
+    })
+    position["position_voters"].append(vote_info["student_id"])
+    candidate["candidate_voters"].append(vote_info["student_id"])
+    
+    return election_info
+
+
+@lru_cache(maxsize=1024)
+def compute_time(time_period):
+    # work in whole minutes so that no float division is involved; going 
+    # through str keeps float periods such as 1.1 from picking up binary error
+    total_minutes = int(Decimal(str(time_period)) * 60)
+    num_days, remaining_minutes = divmod(total_minutes, 24 * 60)
+    num_hours, num_minutes = divmod(remaining_minutes, 60)
     return num_days, num_hours, num_minutes
 
 
+@lru_cache(maxsize=1024)
+def period_to_timedelta(time_period):
+    # an election's period never changes, so its timedelta is computed once
+    num_days, num_hours, num_minutes = compute_time(time_period)
+    return timedelta(days=num_days, hours=num_hours, minutes=num_minutes)
+
+
 def get_duration(election):
-    num_days, num_hours, num_minutes = compute_time(election["election_period"])
-    duration = timedelta(days=num_days, hours=num_hours, minutes=num_minutes)
-    return str(duration)
+    return str(period_to_timedelta(election["election_period"]))
     
     
 def get_end_date(election):
-    num_days, num_hours, num_minutes = compute_time(election["election_period"])
-    time_change = timedelta(days=num_days, hours=num_hours, minutes=num_minutes)
-    return election["election_startdate"] + time_change
+    return election["election_startdate"] + period_to_timedelta(election["election_period"])
 
 
 def get_remaining_time(election):
-    zone_name = "Africa/Accra"
-    current_time = timezone(zone_name)
+    current_time = datetime.now(ACCRA_TIMEZONE)
     return str(election["election_end_date"] - current_time)
\ No newline at end of file
@@ -1,57 +1,77 @@
 # import necessary libraries
 import os
-import json
 # import functions_framework
 from datetime import timedelta
-from flask import Flask, jsonify
+from flask import Flask, Response, jsonify, request
 
 # import helper methods
 from helper import (
     valid_request_body, valid_voter_info, 
-    valid_student_id, valid_keys,
-    key_is_unique, get_voters,
-    
-    FIRST_YEAR_GROUP, VOTERS_COLLECTION, 
-    ELECTIONS_COLLECTION
+    valid_student_id, valid_keys, valid_name, valid_email,
+    get_voters, cached_query, invalidate_cache,
+    unique_index_updates, commit_with_indexes, create_with_indexes, write_in_batches,
+    positions_by_id, cast_vote, OrjsonProvider, stream_json_array, ValidationError,
+    PartialWriteError,
+    
+    submit_read, FIRST_YEAR_GROUP, voters_collection, 
+    elections_collection, get_database
+)
+
+
+# keys an election's information must contain
+ELECTION_KEYS = (
+    "election_code", "election_name", "election_startdate",
+    "election_period", "positions"
 )
 
+# voter attributes that retrieve_voters matches exactly, in the Firestore query
+EXACT_MATCH_KEYS = ("student_id", "year_group", "is_registered")
+
+# voter fields returned when voters are retrieved
+VOTER_FIELDS = ("student_id", "firstname", "lastname", "email", "year_group", "is_registered")
+
+# keys a vote must contain
+VOTING_KEYS = ("student_id", "candidate_id")
+
 
 # Initialising the flask app
 voting_app = Flask(__name__)
+voting_app.json = OrjsonProvider(voting_app)
+
 
+# respond to a request that failed validation with the error's message and status
+@voting_app.errorhandler(ValidationError)
+def validation_error(error):
+    return jsonify(error.payload), error.status
 
-# flask app to handle all requests in the API
+
+# entry point to handle all requests in the API when deployed as a single 
+# cloud function; when run as a flask app, requests go straight to the routes below
 # @functions_framework.http
-voting_app.route("/", methods=["GET", "POST", "PATCH", "PUT", "DELETE"])
 def voting_system(request):
+    # voting is the only POST to elections that does not create one
     if "voters" in request.path:
-        if request.method == "POST":
-            return register_voter(request)
-        elif request.method == "PATCH":
-            return deregister_voter(request)
-        elif request.method == "GET":
-            return get_voters(request)
-        elif request.method == "PUT":
-            return update_voter(request)
-
+        resource = "voters"
     elif "elections" in request.path:
-        if request.method == "POST":
-            return create_election(request)
-        elif request.method == "GET":
-            return retrieve_election(request)
-        elif request.method == "DELETE":
-            return delete_election(request)
-        elif request.method == "POST" and "vote" in request.path:
-            return vote(request)
-
+        resource = "votes" if "vote" in request.path else "elections"
     else:
+        resource = None
+    
+    handler = ROUTES.get((resource, request.method))
+    if handler is None:
         return jsonify({"message": "Invalid endpoint!"}), 404
     
+    # handlers called here bypass flask's error handlers
+    try:
+        return handler()
+    except ValidationError as error:
+        return validation_error(error)
+    
 
 # _____________________________________________________________________________________________________________________
 # REGISTER AN ASHESI STUDENT AS A VOTER
-# @voting_app.route("/voters/register_voter/", methods=["POST"])
-def register_voter(request):
+@voting_app.route("/voters/register_voter/", methods=["POST"])
+def register_voter():
     """handles a POST request to created a voter and returns a JSON
     object of the voter's information if all validation and constraints
     are met. Else, returns JSON representation of the validation or constraint failure
@@ -64,26 +84,26 @@ def register_voter(request):
     if not valid_request_body(request):
         return jsonify({"message": "Voter information missing!"}), 400
     
-    # validate voter info for unique constraints and input validation
-    unique_keys = ["student_id", "email"]
-    response = valid_voter_info(request, unique_keys)
-    if type(response) == tuple:
-        return response
-    
-    voter_info = response["data"]
+    # validate voter info; unique constraints are checked when the voter is created
+    voter_info = valid_voter_info(request, [])
     # set can vote attribute
     voter_info["is_registered"] = True
     
-    # write the data into the voters collection
-    VOTERS_COLLECTION.document(voter_info["student_id"]).set(voter_info)
+    # create the voter and its email index entry in a transaction, which fails
+    # if the student id (the voter's document id) or the email already exists
+    create_with_indexes(
+        get_database().transaction(), voters_collection().document(voter_info["student_id"]),
+        voter_info, voters_collection(), ["email"]
+    )
+    invalidate_cache(voters_collection())
         
     return jsonify(voter_info), 201
 
 
 # __________________________________________________________________________________________________________________________
 # DEREGISTER A STUDENT AS A VOTER
-# @voting_app.route("/voters/de_register/<value>/", methods=["PATCH"])
-def deregister_voter(request):
+@voting_app.route("/voters/de_register/", methods=["PATCH"])
+def deregister_voter():
     """deregisters a specified voter (voter with given student id) or 
     specified voters (students in a particular year group) by setting their
     is_registered attribute to false
@@ -95,11 +115,15 @@ def deregister_voter(request):
         JSON: JSON representation of students deregistered or appropriate message
         if an exception occurs
     """
-    if request.data.get("student_id"):
-        value = request.data.get("student_id")
-        print(value)
-    elif request.data.get("year_group"):
-        value = request.data.get("year_group")
+    # parse the request data once; flask caches the result
+    body = request.get_json(force=True, silent=True) or dict()
+    
+    # student ids and year groups may be sent as strings or numbers
+    if body.get("student_id"):
+        value = str(body.get("student_id"))
+    elif body.get("year_group"):
+        # year groups are stored as numbers, so accept either form
+        value = str(body.get("year_group"))
     else:
         return jsonify({"message": "Invalid attribute!"}), 400
     
@@ -107,34 +131,25 @@ def deregister_voter(request):
     # else, assume it is a student id
     if len(value) == 4 and value.isnumeric() and int(value) >= FIRST_YEAR_GROUP:
         key = "year_group"
+        value = int(value)
     else:
         key = "student_id"
         # ensure that the student id is valid
         if not valid_student_id(value):
             return jsonify({"message": "Invalid student id!"}), 400
     
-    voters_data = VOTERS_COLLECTION.get()              # get all voters    
-    updated_voters_data = list()                    # list of all voters
+    # get only the voters with the specified student id or in the specified
+    # year group, letting Firestore do the filtering
+    voters_data = voters_collection().where(key, "==", value).select(VOTER_FIELDS).stream()
     updated_voters = []                             # list of only updated voters
-
-    # update specified user's is_registered attribute to deregister them
-    if key == "student_id":
-        for voter in voters_data:
-            voter = voter.to_dict()
-            if voter[key] == value:
-                voter["is_registered"] = False
-                updated_voters.append(voter)
-            updated_voters_data.append(voter)
-    
-    # updated all students in specified year group's is_registered attribute
-    else:
-        for voter in voters_data:
-            voter = voter.to_dict()
-            id_details = valid_student_id(voter["student_id"])
-            if id_details[key] == value:
-                voter["is_registered"] = False
-                updated_voters.append(voter)
-            updated_voters_data.append(voter)
+    updated_refs = []                               # documents of updated voters
+
+    # update the matching voters' is_registered attribute to deregister them
+    for voter in voters_data:
+        updated_refs.append(voter.reference)
+        voter = voter.to_dict()
+        voter["is_registered"] = False
+        updated_voters.append(voter)
         
     # if user with id not found, return appropriate message
     if not updated_voters and key == "student_id":
@@ -142,9 +157,17 @@ def deregister_voter(request):
     elif not updated_voters and key == "year_group":
         return jsonify({"message": f"No registered voter in the {value} year group!"}), 404    
         
-    # write updated data into the voters collection
-    for voter in updated_voters:
-        VOTERS_COLLECTION.document(voter["student_id"]).set(voter)
+    # write only the changed field into the voters collection, in batches
+    # (the cache is dropped even if only some of the batches were committed)
+    try:
+        write_in_batches(((voter_ref, {"is_registered": False}) for voter_ref in updated_refs), "update")
+    except PartialWriteError as error:
+        return jsonify({
+            "message": f"Only {error.num_written} of {len(updated_refs)} voters have been de-registered, try again!",
+            "failed": [voter_ref.id for voter_ref in error.failed_refs]
+        }), 500
+    finally:
+        invalidate_cache(voters_collection())
 
     # attach appropriate message title
     if key == "student_id":
@@ -157,19 +180,22 @@ def deregister_voter(request):
 
 # ____________________________________________________________________________________________________________________________________
 # UPDATE REGISTERED VOTER'S INFORMATION
-# @voting_app.route("/voters/update_voter/<student_id>/", methods=["PUT"])
-def update_voter(request):
-    """updates the details of the voter with the specified student id if it exists
-    else it creates a new record in the database if the request data meet all specified constraints
+@voting_app.route("/voters/update_voter/", methods=["PUT"])
+def update_voter():
+    """updates the details of the registered voter with the specified student id 
+    if the request data meet all specified constraints
 
     Args:
         student_id (str): the voter's student id
 
     Returns:
-        dict: JSON object of the updated or created object
+        dict: JSON object of the updated object
     """
-    if request.data.get("student_id"):
-        student_id = request.data.get("student_id")
+    # parse the request data once; flask caches the result for valid_voter_info
+    body = request.get_json(force=True, silent=True) or dict()
+    
+    if body.get("student_id"):
+        student_id = body.get("student_id")
     else:
         return jsonify({"message": "Invalid attribute!"}), 400
     
@@ -177,51 +203,47 @@ def update_voter(request):
     if not valid_student_id(student_id):
         return jsonify({"message": "Invalid student id!"}), 400
     
+    # read only the voter with specified id, in the background while 
+    # the voter info is validated (which does its own read)
+    voter_ref = voters_collection().document(student_id)
+    voter_future = submit_read(voter_ref.get)
+    
     unique_keys = ["email"]
     # validate voter_info
-    response = valid_voter_info(request, unique_keys)
-    # if validation failed, return appropriate message
-    if type(response) == tuple:         
-        return response
-    
-    # get validated voter info 
-    voter_info = response["data"]
+    voter_info = valid_voter_info(request, unique_keys)
     
     if not voter_info["is_registered"]:
         return jsonify({"message": "You cannot use update to deregister, use dregister function instead!"})
     
-    # reading existing data into a list
-    voters_data = VOTERS_COLLECTION.get()
-    updated_voters_data = list()
- 
-    if not voters_data:
-        VOTERS_COLLECTION.document(voter_info["student_id"]).set(voter_info)
-    else:
-        # get the voter with specified id
-        for voter in voters_data:
-            voter = voter.to_dict()
-            if voter["student_id"] == voter_info["student_id"]:
-
-                # ensure that the voter specified is registered
-                if not voter["is_registered"]:
-                    return jsonify({"message": f"Voter with id {student_id} is not registered."}), 404
-                
-                # replace data in file
-                voter = voter_info
-                voter["is_registered"] = True
-            updated_voters_data.append(voter)
-        
-    # write the updated data into the file
-    for voter in updated_voters_data:
-        VOTERS_COLLECTION.document(voter["student_id"]).set(voter)
+    voter = voter_future.result()
+    
+    # only existing voters can be updated; new voters go through register_voter, 
+    # which also indexes their student id
+    if not voter.exists:
+        return jsonify({"message": f"student with id {student_id} has not been registered as a voter!"}), 404
+    
+    previous_info = voter.to_dict()
+
+    # ensure that the voter specified is registered
+    if not previous_info["is_registered"]:
+        return jsonify({"message": f"Voter with id {student_id} is not registered."}), 404
+    
+    voter_info["is_registered"] = True
+    
+    # write the updated voter and its unique key indexes in one batch
+    commit_with_indexes(
+        voter_ref, voter_info,
+        unique_index_updates(voters_collection(), unique_keys, voter_info, previous_info)
+    )
+    invalidate_cache(voters_collection())
     
     return jsonify(voter_info)
 
 
 # ________________________________________________________________________________________________________________________________________________
 # RETRIEVE A REGISTERED VOTER 
-# @voting_app.route("/voters/get/", methods=["GET"])
-def retrieve_voters(request):
+@voting_app.route("/voters/get/", methods=["GET"])
+def retrieve_voters():
     """uses all specified arguments (attributes of voter) parsed for filtering
     matching voters and returns the result. If no attribute is parsed, it retrieves
     all users If any exception occur, it returns an appropriate message of the exception
@@ -236,10 +258,6 @@ def retrieve_voters(request):
     # dict to store all keys and values for filter
     filter_dict = dict()
     
-    # stores resulting list from filtering
-    result_list = list()
-    final_result_list = list()
-    
     # get all attributes specified in the request args
     if request.args.get("student_id"):
         filter_dict["student_id"] = request.args.get("student_id")
@@ -259,19 +277,6 @@ def retrieve_voters(request):
     if request.args.get("is_registered"):
         filter_dict["is_registered"] = request.args.get("is_registered")
 
-    # read the voters file
-    data = VOTERS_COLLECTION.get()
-    voters_data = list()
-    for voter in data:
-        voters_data.append(voter.to_dict())
-        
-    if not voters_data:
-        return jsonify({"message": "No voter has been registered!"}), 404
-    
-    # if no argument is parsed, retrieve all users
-    if not filter_dict:
-        return jsonify(voters_data)
-        
     for key in filter_dict.keys():
 
         # ensure that the value of key is valid
@@ -281,15 +286,15 @@ def retrieve_voters(request):
                 return jsonify({"message": "Student ID is not valid."}), 400
 
         elif key == "firstname":
-            if not str(filter_dict[key]).isalpha():
+            if not valid_name(filter_dict[key]):
                 return jsonify({"message": "Firstname must be a string."}), 400
             
         elif key == "lastname":
-            if not str(filter_dict[key]).isalpha():
+            if not valid_name(filter_dict[key]):
                 return jsonify({"message": "Lastname must be a string."}), 400
         
         elif key == "email":
-            if not filter_dict[key].endswith("@ashesi.edu.gh"):
+            if not valid_email(filter_dict[key]):
                 return jsonify({"message": "Email must be a valid Ashesi email address."}), 400
             
         elif key == "is_registered":
@@ -301,76 +306,62 @@ def retrieve_voters(request):
                 return jsonify({"message": "Invalid value for is_registered attribute!"}), 400
             
         else:
-            if int(filter_dict["year_group"]) < FIRST_YEAR_GROUP:
-                return jsonify({"message": "Student year group is invalid."})
-            
-        # empty the result list before new filter is applied
-        result_list.clear()
-            
-        # get all user with specified key
-        for voter in voters_data:
-            # since year group isn't being stored, handle it differently
-            if key == "year_group":
-                # get year group of voter from voter's student_id
-                student_id_details = valid_student_id(voter.get("student_id"))
-                year_group = student_id_details["year_group"]
-                if year_group == filter_dict[key]:
-                    result_list.append(voter)
-            else:
-                if type(filter_dict[key]) == str:
-                    if voter.get(key).lower() == filter_dict[key].lower() or voter.get(key).lower().startswith(filter_dict[key].lower()):
-                        result_list.append(voter)
-                else:
-                    if voter.get(key) == filter_dict[key]:
-                        result_list.append(voter)
+            # year groups are stored on each voter as a number
+            if not (filter_dict[key].isascii() and filter_dict[key].isdigit()):
+                return jsonify({"message": "Student year group is invalid."}), 400
+            filter_dict[key] = int(filter_dict[key])
+            if filter_dict[key] < FIRST_YEAR_GROUP:
+                return jsonify({"message": "Student year group is invalid."}), 400
+    
+    # let Firestore apply the exact match filters in a single compound query
+    # (repeated queries within a few seconds are served from the cache)
+    exact_filters = [(key, filter_dict[key]) for key in EXACT_MATCH_KEYS if key in filter_dict]
+    voters_data = cached_query(voters_collection(), exact_filters, VOTER_FIELDS)
         
-        # update the data being returned
-        final_result_list = result_list[:]
+    # if no argument is parsed, retrieve all users
+    if not filter_dict:
+        if not voters_data:
+            return jsonify({"message": "No voter has been registered!"}), 404
+        return Response(stream_json_array(voters_data), mimetype="application/json")
+    
+    # names and emails are matched case-insensitively by prefix, 
+    # which Firestore cannot do, so they are filtered here
+    # (an exact match is also a prefix match)
+    for key in filter_dict.keys():
+        if key in EXACT_MATCH_KEYS:
+            continue
         
-        # update the data being used for filtering
-        voters_data = final_result_list
+        prefix = filter_dict[key].lower()
+        voters_data = [voter for voter in voters_data if voter.get(key, "").lower().startswith(prefix)]
                 
     # ensure that the result list is not empty
-    if not final_result_list:
+    if not voters_data:
         return jsonify({"message": "No voter found with the provided details"}), 404
             
-    return jsonify(final_result_list)
+    return Response(stream_json_array(voters_data), mimetype="application/json")
 
 
 # ______________________________________________________________________________________________________________________________________________________________
 # CREATE AN ELECTION
-# @voting_app.route("/elections/create_election/", methods=["POST"])
-def create_election(request):
+@voting_app.route("/elections/create_election/", methods=["POST"])
+def create_election():
     
     # ensure that the request's data is not empty
     if not valid_request_body(request):
         return jsonify({"message": "Election information not provided!"}), 404
     
     # get election information from request 
-    election_info = json.loads(request.data)
+    election_info = request.get_json(force=True, silent=True) or dict()
     
     # ensure that the data contains all expected fields
     # if validation fails, return appropriate message
-    # expected keys
-    ELECTION_KEYS = [
-            "election_code", "election_name", "election_startdate",
-            "election_period", "positions"
-        ]
-    
     validate_data = valid_keys(election_info, ELECTION_KEYS)
     if validate_data["is_valid"] == False:
         return jsonify(validate_data["message"]), 400
     
-    # read existing elections data
-    data = ELECTIONS_COLLECTION.get()
-    
-    # validate election unique constraints if there are existing election information
-    unique_keys = ["election_code", "election_name"]
-    if data:    
-        elections_data = json.loads(data)
-        ununique_result = key_is_unique(unique_keys, elections_data, election_info)
-        if len(ununique_result) > 0:
-            return jsonify(ununique_result), 400
+    # the election code is the election's document id, so only the election 
+    # name needs an index; both are checked when the election is created
+    unique_keys = ["election_name"]
         
     # NOTE: PROGRAM ASSUMES DATA FOR VARIOUS FIELDS HAVE BEEN VALIDATED AND DATA FORMATS (STRUCTURES, etc) ARE VALID
         
@@ -392,62 +383,67 @@ def create_election(request):
             updated_candidates.append(candidates_dictionary)
 
         position["candidates"] = updated_candidates
+        # students who have voted for any candidate in this position
+        position["position_voters"] = list()
         updated_positions.append(position)
     
-    election_info["positions"] = updated_positions     
+    # store positions and candidates keyed by their ids so that a vote can 
+    # update a single candidate's voters in place
+    election_info["positions"] = positions_by_id(updated_positions)
     
-    # write the data to elections collection
-    ELECTIONS_COLLECTION.document(election_info["election_code"]).set(election_info)
+    # create the election and its unique key indexes in a transaction, which 
+    # fails if the election code or name already exists
+    create_with_indexes(
+        get_database().transaction(), elections_collection().document(election_info["election_code"]),
+        election_info, elections_collection(), unique_keys, "election_code"
+    )
+    invalidate_cache(elections_collection())
     
     return jsonify(election_info)
 
 
 # ____________________________________________________________________________________________________________________________________________________
 # RETRIEVE AN ELECTION
-# @voting_app.route("/elections/get/<election_code>/", methods=["GET"])
-def retrieve_election(request):
-
-    # read election file
-    elections_data = ELECTIONS_COLLECTION.get()
+@voting_app.route("/elections/get/", methods=["GET"])
+def retrieve_election():
 
     # get election code from request
     if request.args.get("election_code") == None:
-        return jsonify(elections_data)
+        # read election file
+        elections_data = cached_query(elections_collection())
+        return Response(stream_json_array(elections_data), mimetype="application/json")
     
     election_code = request.args.get("election_code")
     
-    # ensure that there are existing data
-    if not elections_data:
-        return jsonify({"message": "No elections have been created!"}), 404
-    
-    # loop through data and check if requested key exists
-    for election in elections_data:
-        election = election.to_dict()
-        if election["election_code"] == election_code:
-            return jsonify(election)
+    # read only the election with the requested code
+    elections_data = cached_query(elections_collection(), [("election_code", election_code)])
+    if elections_data:
+        return jsonify(elections_data[0])
     
     return jsonify({"message": "Election with requested code does not exist!"}), 404
 
 
 # _______________________________________________________________________________________________________________________________________________________
 # DELETE AN ELECTION
-# @voting_app.route("/elections/delete_election/<election_code>/", methods=["DELETE"])
-def delete_election(request):
-    # read election file
-    elections_data = ELECTIONS_COLLECTION.get()
-
+@voting_app.route("/elections/delete_election/", methods=["DELETE"])
+def delete_election():
     # get election code from request
-    if request.data.get("election_code"):
-        election_code = request.data.get("election_code")
+    body = request.get_json(force=True, silent=True) or dict()
+    if body.get("election_code"):
+        election_code = body.get("election_code")
     else:
         return jsonify({"message": "Election code not provided!"}), 400
     
-    # ensure that there are existing data
-    if not elections_data:
-        return jsonify({"message": "No elections have been created!"}), 404
-        
-    # delete document from elections collection
-    if ELECTIONS_COLLECTION.document(election_code).delete():
+    election = elections_collection().document(election_code).get()
+    
+    # delete document from elections collection, releasing its unique keys
+    if election.exists:
+        unique_keys = ["election_name"]
+        commit_with_indexes(
+            election.reference, None,
+            unique_index_updates(elections_collection(), unique_keys, None, election.to_dict(), "election_code")
+        )
+        invalidate_cache(elections_collection())
         return jsonify({"message": f"Election with code {election_code} has been deleted successfully!"}) #, 204
     
     return jsonify({"message": "Election with requested code does not exist!"}), 404
@@ -455,8 +451,8 @@ def delete_election(request):
 
 # ________________________________________________________________________________________________________________________________________________________
 # VOTE IN AN ELECTION
-# @voting_app.route("/elections/vote/<election_code>/", methods=["POST"])
-def vote(request):
+@voting_app.route("/elections/vote/", methods=["POST"])
+def vote():
     
     # get position from URL argument
     position_id = request.args.get("position_id")
@@ -469,17 +465,14 @@ def vote(request):
         return jsonify({"message": "Election information not provided!"}), 404
     
     # get request data
-    vote_info = json.loads(request.data)
+    vote_info = request.get_json(force=True, silent=True) or dict()
 
     # get election code from data
-    if request.data.get("election_code"):
-        election_code = request.data.get("election_code")
+    election_code = vote_info.get("election_code")
+    if not election_code:
+        return jsonify({"message": "Election code not provided!"}), 400
     
     # ensure that the data contains student_id and candidate_id
-    VOTING_KEYS = [
-            "student_id", "candidate_id"
-        ]
-    
     validate_data = valid_keys(vote_info, VOTING_KEYS)
     if validate_data["is_valid"] == False:
         return jsonify(validate_data["message"]), 400
@@ -498,75 +491,28 @@ def vote(request):
     student_list = [vote_info["student_id"], vote_info["candidate_id"]]
     students_registered = get_voters(student_list)
     
-    if students_registered == False:
+    if not students_registered:
         return jsonify({"message": "Voter or candidate not registered!"}), 404
     
-    # read data
-    voters_data = VOTERS_COLLECTION.get()
-    elections_data = ELECTIONS_COLLECTION.get()
-    
-    if not voters_data:
-        return jsonify({"message": "No voter has been registered!"}), 404
-    
-    if not elections_data:
-        return jsonify({"message": "No election has been created!"}), 404
-    
-    election_info = None
-    updated_elections_data = list()
-    
-    for election in elections_data:
-        election = election.to_dict()
-        if election["election_code"] == election_code:
-            
-            # ensure that the position exist
-            positions = election["positions"]
-            updated_position = list()
-            for position in positions:
-                if position["position_id"] == position_id:
-                    
-                    all_voters = list()
-                    # ensure that the candidate is valid
-                    candidate_exists = False
-                    candidates = position["candidates"]
-                    updated_candidate = list()
-                    for candidate in candidates:
-                        # get all those who have voted in that election position
-                        all_voters.extend(candidate["candidate_voters"])
-                        
-                        if candidate["candidate_id"] == vote_info["candidate_id"]:
-                            candidate_exists = True
-                            
-                    if not candidate_exists:
-                        return jsonify({"message": f"Candidate with id {vote_info['candidate_id']} has not been registered for the {position['position_name']} position!"})
-                    
-                    # ensure that the candidate hasn't voted before
-                    if vote_info["student_id"] in all_voters:
-                        return jsonify({"message": "You cannot vote twice for one position!"}), 403
-                    
-                    # cast vote by adding student id to candidate_voters
-                    for candidate in candidates:
-                        if candidate["candidate_id"] == vote_info["candidate_id"]:
-                            candidate["candidate_voters"].append(vote_info["student_id"])
-                            
-                        updated_candidate.append(candidate)
-                    position["candidates"] = updated_candidate
-                    
-                    break
-                updated_position.append(position)
-            election_info = election
-            updated_elections_data.append(election)
-
-            break
-        updated_elections_data.append(election)
-    
-    if election_info == None:
-        return jsonify({"message": f"Election with code {election_code} does not exist!"}), 404
-    
-    # write result to the elections collection
-    for election in updated_elections_data:
-        ELECTIONS_COLLECTION.document(election["election_code"]).set(election)
+    # cast the vote in a transaction, so that concurrent votes cannot overwrite each other
+    election_ref = elections_collection().document(election_code)
+    election_info = cast_vote(get_database().transaction(), election_ref, position_id, vote_info)
+    invalidate_cache(elections_collection())
         
     return jsonify(election_info)
 
+
+# handler of each (resource, method) pair, used by voting_system
+ROUTES = {
+    ("voters", "POST"): register_voter,
+    ("voters", "PATCH"): deregister_voter,
+    ("voters", "GET"): retrieve_voters,
+    ("voters", "PUT"): update_voter,
+    ("elections", "POST"): create_election,
+    ("elections", "GET"): retrieve_election,
+    ("elections", "DELETE"): delete_election,
+    ("votes", "POST"): vote
+}
+
 # if __name__=='__main__':
 #     voting_app.run()
\ No newline at end of file
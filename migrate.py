@@ -0,0 +1,104 @@
+# one-time migration of existing Firestore data
+# run with: python migrate.py
+from firebase_admin.firestore import FieldPath
+
+from helper import (
+    unique_index_updates, valid_student_id, write_in_batches, positions_by_id, ValidationError,
+
+    voters_collection, elections_collection
+)
+
+
+def build_unique_indexes():
+    """writes the unique key index documents for all records that were
+    created before the indexes were maintained on write
+    """
+
+    # unique keys indexed for each collection, and the key identifying a record
+    indexed_collections = [
+        (voters_collection(), ["email"], "student_id"),
+        (elections_collection(), ["election_name"], "election_code")
+    ]
+
+    for collection, unique_keys, id_key in indexed_collections:
+        indexes = dict()
+        # only the indexed fields are needed from each record
+        for document in collection.select(unique_keys).stream():
+            record = document.to_dict()
+            for index_ref, index_data in unique_index_updates(collection, unique_keys, record, id_key=id_key):
+                indexes.setdefault(index_ref.id, (index_ref, dict()))[1].update(index_data)
+
+        for index_ref, index_data in indexes.values():
+            index_ref.set(index_data, merge=True)
+        print(f"Indexed {collection.id} on {', '.join(unique_keys)}")
+
+
+def add_year_groups():
+    """stores the year group (derived from the student id) on every voter 
+    registered before it was saved with the voter
+    """
+
+    updates = list()
+    for voter in voters_collection().select(["student_id", "year_group"]).stream():
+        voter_info = voter.to_dict()
+        if voter_info.get("year_group") is not None:
+            continue
+
+        student_id_details = valid_student_id(voter_info.get("student_id"))
+        if student_id_details:
+            updates.append((voter.reference, {"year_group": student_id_details["year_group"]}))
+
+    num_writes = write_in_batches(updates, "update")
+    print(f"Added the year group to {num_writes} voters")
+
+
+def key_positions_by_id():
+    """stores the positions and candidates of elections created as lists 
+    as maps keyed by their ids, which votes are written against
+    """
+
+    updates = list()
+    for election in elections_collection().select(["positions"]).stream():
+        positions = election.get("positions")
+        if isinstance(positions, list):
+            # elections with ids that cannot be keyed are left for manual repair
+            try:
+                updates.append((election.reference, {"positions": positions_by_id(positions)}))
+            except ValidationError as error:
+                print(f"Skipped election {election.id}: {error.payload['message']}")
+
+    num_writes = write_in_batches(updates, "update")
+    print(f"Keyed the positions of {num_writes} elections by id")
+
+
+def add_position_voters():
+    """stores on every position of elections created before it was tracked 
+    the students who have voted for any of its candidates
+    """
+
+    updates = list()
+    for election in elections_collection().select(["positions"]).stream():
+        positions = election.get("positions")
+        position_updates = dict()
+        for position_id, position in positions.items():
+            if "position_voters" in position:
+                continue
+            
+            position_voters = set()
+            for candidate in position["candidates"].values():
+                position_voters.update(candidate["candidate_voters"])
+            position_voters_path = FieldPath("positions", position_id, "position_voters").to_api_repr()
+            position_updates[position_voters_path] = sorted(position_voters)
+        
+        if position_updates:
+            updates.append((election.reference, position_updates))
+
+    num_writes = write_in_batches(updates, "update")
+    print(f"Added the position voters to {num_writes} elections")
+
+
+if __name__ == "__main__":
+    build_unique_indexes()
+    add_year_groups()
+    key_positions_by_id()
+    add_position_voters()